@@ -1,22 +1,38 @@
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Tuple
 from fastapi import Request
+import hashlib
+import logging
+import os
+import threading
 import time
 
+import bcrypt
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+from jose import jwk, jwt, JWTError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.redis_client import async_redis_client, redis_errors
 from app.db.session import SessionLocal
 from app.db.models import UserDB
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+log = logging.getLogger(__name__)
+
+# bcrypt учитывает только первые 72 байта пароля (passlib обрезал так же)
+BCRYPT_MAX_PASSWORD_BYTES = 72
 
 security = HTTPBearer()
 
+# ключ и список алгоритмов собираем один раз: jose не будет заново
+# разбирать SECRET_KEY (включая попытку json.loads) на каждый токен
+JWT_KEY = jwk.construct(settings.SECRET_KEY, settings.ALGORITHM)
+JWT_ALGORITHMS = [settings.ALGORITHM]
+ACCESS_TOKEN_EXPIRE = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -28,24 +44,58 @@ def get_db():
 RATE_LIMIT_REQUESTS = 60
 RATE_LIMIT_WINDOW_SECONDS = 60
 
-_rate_limit_store: Dict[str, Tuple[int, float]] = {}  # ip -> (count, window_start)
+# Фиксированная таблица счётчиков: слот = hash(ip) & (N - 1).
+# Память не растёт с числом IP; ценой этого два IP, попавшие в один слот,
+# делят общий лимит (редкие ложные срабатывания).
+RATE_LIMIT_SLOTS = 4096  # степень двойки
+
+_rate_limit_counts = array("i", [0] * RATE_LIMIT_SLOTS)
+_rate_limit_windows = array("d", [0.0] * RATE_LIMIT_SLOTS)
+
+
+def _local_rate_limit_hit(identifier: str, now: float) -> Tuple[int, float]:
+    slot = hash(identifier) & (RATE_LIMIT_SLOTS - 1)
+    window_start = _rate_limit_windows[slot]
+
+    if now - window_start > RATE_LIMIT_WINDOW_SECONDS:
+        _rate_limit_counts[slot] = 0
+        _rate_limit_windows[slot] = window_start = now
+
+    count = _rate_limit_counts[slot] + 1
+    _rate_limit_counts[slot] = count
+    return count, window_start
+
+
+async def _redis_rate_limit_hit(identifier: str, now: float) -> Tuple[int, float]:
+    # окно фиксированное и общее для всех воркеров: rl:<ip>:<номер окна>
+    window = int(now // RATE_LIMIT_WINDOW_SECONDS)
+    key = f"rl:{identifier}:{window}"
+
+    # SET NX EX создаёт ключ с TTL только в первый раз (EXPIRE ... NX есть лишь с Redis 7)
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(key, 0, ex=RATE_LIMIT_WINDOW_SECONDS, nx=True)
+        pipe.incr(key)
+        _, count = await pipe.execute()
+
+    return count, float(window * RATE_LIMIT_WINDOW_SECONDS)
 
 
 async def rate_limit_dependency(request: Request):
     identifier = request.client.host or "unknown"
     now = time.time()
 
-    count, window_start = _rate_limit_store.get(identifier, (0, now))
-
-    if now - window_start > RATE_LIMIT_WINDOW_SECONDS:
-        count = 0
-        window_start = now
+    if async_redis_client is not None:
+        try:
+            count, window_start = await _redis_rate_limit_hit(identifier, now)
+        except redis_errors as e:
+            # Redis недоступен — считаем лимит в памяти процесса, а не отдаём 500
+            log.warning("redis rate limit failed, using local counters: %s", e)
+            count, window_start = _local_rate_limit_hit(identifier, now)
+    else:
+        count, window_start = _local_rate_limit_hit(identifier, now)
 
-    count += 1
     remaining = max(RATE_LIMIT_REQUESTS - count, 0)
 
-    _rate_limit_store[identifier] = (count, window_start)
-
     request.state.x_limit_remaining = remaining
     retry_after = 0
     if count > RATE_LIMIT_REQUESTS:
@@ -64,27 +114,113 @@ async def rate_limit_dependency(request: Request):
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_COST)
+    return bcrypt.hashpw(password.encode()[:BCRYPT_MAX_PASSWORD_BYTES], salt).decode()
+
+
+VERIFY_CACHE_TTL_SECONDS = 30
+VERIFY_CACHE_MAX_SIZE = 10_000
+
+# blake2b(hashed | plain) -> expires_at; храним только успешные проверки.
+# Ключ blake2b случайный на процесс, поэтому по кэшу пароль не подобрать.
+_verify_cache: Dict[bytes, float] = {}
+_verify_cache_secret = os.urandom(16)
+
+
+def _verify_cache_key(plain: str, hashed: str) -> bytes:
+    return hashlib.blake2b(
+        hashed.encode() + b"|" + plain.encode(),
+        key=_verify_cache_secret,
+        digest_size=16,
+    ).digest()
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+    key = _verify_cache_key(plain, hashed)
+    expires_at = _verify_cache.get(key)
+    if expires_at and expires_at > time.monotonic():
+        return True
+
+    if not bcrypt.checkpw(plain.encode()[:BCRYPT_MAX_PASSWORD_BYTES], hashed.encode()):
+        return False
 
+    if len(_verify_cache) >= VERIFY_CACHE_MAX_SIZE:
+        _verify_cache.clear()
+    _verify_cache[key] = time.monotonic() + VERIFY_CACHE_TTL_SECONDS
+    return True
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + (
-        expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    expire = datetime.utcnow() + (expires_delta or ACCESS_TOKEN_EXPIRE)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return jwt.encode(to_encode, JWT_KEY, algorithm=settings.ALGORITHM)
 
 
 def get_user_by_email(db: Session, email: str) -> Optional[UserDB]:
     return db.query(UserDB).filter(UserDB.email == email).first()
 
 
+JWT_CACHE_TTL_SECONDS = 60
+JWT_CACHE_MAX_SIZE = 10_000
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_SIZE = 10_000
+
+# token -> (payload, expires_at); LRU, вытесняем самые старые записи
+_jwt_cache: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+# user_id -> (user, expires_at); user — detached-объект, в сессию попадает через merge
+_user_cache: Dict[int, Tuple[UserDB, float]] = {}
+_cache_lock = threading.Lock()
+
+
+def decode_access_token(token: str) -> dict:
+    # сроки жизни кэшей — по monotonic, чтобы перевод системных часов их не ломал
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _jwt_cache.get(token)
+        if cached and cached[1] > now:
+            _jwt_cache.move_to_end(token)
+            return cached[0]
+
+    payload = jwt.decode(token, JWT_KEY, algorithms=JWT_ALGORITHMS)
+
+    # запись живёт не дольше самого токена (exp — по настенным часам, переводим в остаток)
+    ttl = JWT_CACHE_TTL_SECONDS
+    exp = payload.get("exp")
+    if exp is not None:
+        ttl = min(ttl, float(exp) - time.time())
+    expires_at = now + ttl
+
+    with _cache_lock:
+        _jwt_cache[token] = (payload, expires_at)
+        _jwt_cache.move_to_end(token)
+        while len(_jwt_cache) > JWT_CACHE_MAX_SIZE:
+            _jwt_cache.popitem(last=False)
+
+    return payload
+
+
+def get_user_by_id(db: Session, user_id: int) -> Optional[UserDB]:
+    now = time.monotonic()
+    cached = _user_cache.get(user_id)
+    if cached and cached[1] > now:
+        # привязываем копию к текущей сессии без SELECT
+        return db.merge(cached[0], load=False)
+
+    # PK-путь: identity map, без сборки Query
+    user = db.get(UserDB, user_id)
+    if not user:
+        return None
+
+    # в кэш кладём отвязанный объект, чтобы commit чужой сессии его не "протухал"
+    db.expunge(user)
+    with _cache_lock:
+        if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+            _user_cache.clear()
+        _user_cache[user_id] = (user, now + USER_CACHE_TTL_SECONDS)
+    return db.merge(user, load=False)
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db),
@@ -92,7 +228,7 @@ def get_current_user(
     token = credentials.credentials
 
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(token)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -106,7 +242,7 @@ def get_current_user(
             detail="Invalid token payload",
         )
 
-    user = db.query(UserDB).filter(UserDB.id == int(user_id)).first()
+    user = get_user_by_id(db, int(user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from typing import List
 
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from app.core.idempotency import idempotency_dependency, save_idempotent_response
 
 from app.api import deps
@@ -43,20 +44,24 @@ def create_task(
 ):
     if getattr(request.state, "idem_reused", False):
         status_code, body = request.state.idem_response
-        return JSONResponse(status_code=status_code, content=body)
-
-    task = TaskDB(
-        owner_id=current_user.id,
-        title=task_in.title,
-        description=task_in.description,
-        status=task_in.status,
-        due_date=task_in.due_date,
+        return ORJSONResponse(status_code=status_code, content=body)
+
+    # INSERT ... RETURNING: строка со всеми значениями за один запрос, без refresh
+    stmt = (
+        insert(TaskDB)
+        .values(
+            owner_id=current_user.id,
+            title=task_in.title,
+            description=task_in.description,
+            status=task_in.status,
+            due_date=task_in.due_date,
+        )
+        .returning(TaskDB)
     )
-    db.add(task)
-    db.commit()
-    db.refresh(task)
-
+    task = db.execute(stmt).scalar_one()
+    # сериализуем до commit: после него атрибуты expire'ятся
     data = TaskV1.from_orm(task).dict()
+    db.commit()
     save_idempotent_response(request, status.HTTP_201_CREATED, data)
     return data
 
@@ -105,7 +110,6 @@ def update_task(
 
     task.updated_at = datetime.utcnow()
 
-    db.add(task)
     db.commit()
     db.refresh(task)
     return task
@@ -1,12 +1,59 @@
+import time
+from typing import Dict, Optional, Tuple
+
 from fastapi import APIRouter, Depends
-from sqlalchemy import func
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.api import deps
-from app.db.models import UserDB, TaskDB, TaskStatus
+from app.db.models import UserDB
 
 router = APIRouter(tags=["internal v2"], prefix="/internal")
 
+STATS_CACHE_TTL_SECONDS = 30
+
+# ((tasks_count, tasks_by_status), expires_at) — общий для всех запросов
+_task_counts_cache: Optional[Tuple[Tuple[int, Dict[str, int]], float]] = None
+
+
+def _estimate_count(db: Session, model) -> int:
+    # оценка планировщика из каталога вместо полного COUNT(*);
+    # to_regclass находит ту же таблицу, что и ORM (схема из имени или search_path)
+    estimate = db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"),
+        {"t": model.__table__.fullname},
+    ).scalar()
+    # -1 / 0 — таблицу ещё не анализировали: считаем точно
+    if not estimate or estimate < 0:
+        return db.query(model).count()
+    return estimate
+
+
+def _get_task_counts(db: Session) -> Tuple[int, Dict[str, int]]:
+    global _task_counts_cache
+
+    now = time.monotonic()
+    if _task_counts_cache and _task_counts_cache[1] > now:
+        return _task_counts_cache[0]
+
+    # один проход по таблице: разбивка по статусам + общий итог (строка с status = NULL)
+    rows = db.execute(
+        text("SELECT status, COUNT(*) FROM tasks GROUP BY GROUPING SETS ((status), ())")
+    ).all()
+
+    tasks_count = 0
+    tasks_by_status_dict: Dict[str, int] = {}
+    for status, count in rows:
+        if status is None:
+            tasks_count = count
+        else:
+            key = status.value if hasattr(status, "value") else str(status)
+            tasks_by_status_dict[key] = count
+
+    result = (tasks_count, tasks_by_status_dict)
+    _task_counts_cache = (result, now + STATS_CACHE_TTL_SECONDS)
+    return result
+
 
 @router.get("/stats")
 def get_internal_stats(
@@ -14,22 +61,9 @@ def get_internal_stats(
     _rate = Depends(deps.rate_limit_dependency),
     current_user=Depends(deps.get_current_user),
 ):
-    users_count = db.query(UserDB).count()
-    tasks_count = db.query(TaskDB).count()
-
-    tasks_by_status = (
-        db.query(TaskDB.status, func.count(TaskDB.id))
-        .group_by(TaskDB.status)
-        .all()
-    )
-
-    tasks_by_status_dict = {
-        status.value if hasattr(status, "value") else str(status): count
-        for status, count in tasks_by_status
-    }
-
+    tasks_count, tasks_by_status = _get_task_counts(db)
     return {
-        "users_count": users_count,
+        "users_count": _estimate_count(db, UserDB),
         "tasks_count": tasks_count,
-        "tasks_by_status": tasks_by_status_dict,
+        "tasks_by_status": tasks_by_status,
     }
@@ -1,15 +1,17 @@
-from typing import List, Optional, Set
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from app.core.idempotency import idempotency_dependency, save_idempotent_response
 
 from app.api import deps
 from app.db.models import TaskDB, TaskStatus, TaskPriority
-from app.schemas.tasks import TaskCreate, TaskV2
+from app.schemas.tasks import TaskCreate, TaskV2, TASKS_V2_ADAPTER
 
 router = APIRouter(tags=["tasks v2"], prefix="/tasks")
 
@@ -18,6 +20,17 @@ class TaskCreateV2(TaskCreate):
     priority: TaskPriority = TaskPriority.medium
 
 
+# поле схемы TaskV2 -> колонка TaskDB (в порядке полей схемы)
+TASK_V2_COLUMNS = {name: getattr(TaskDB, name) for name in TaskV2.model_fields}
+
+
+@lru_cache(maxsize=256)
+def _parse_include(include: str) -> Tuple[str, ...]:
+    # на практике include повторяется, поэтому разбираем строку один раз
+    requested_fields = frozenset(f.strip() for f in include.split(",") if f.strip())
+    return tuple(name for name in TASK_V2_COLUMNS if name in requested_fields)
+
+
 @router.get("/", response_model=List[TaskV2])
 def list_tasks_v2(
     status_filter: Optional[TaskStatus] = None,
@@ -54,21 +67,25 @@ def create_task_v2(
 ):
     if getattr(request.state, "idem_reused", False):
         status_code, body = request.state.idem_response
-        return JSONResponse(status_code=status_code, content=body)
-
-    task = TaskDB(
-        owner_id=current_user.id,
-        title=task_in.title,
-        description=task_in.description,
-        status=task_in.status,
-        priority=task_in.priority,
-        due_date=task_in.due_date,
+        return ORJSONResponse(status_code=status_code, content=body)
+
+    # INSERT ... RETURNING: строка со всеми значениями за один запрос, без refresh
+    stmt = (
+        insert(TaskDB)
+        .values(
+            owner_id=current_user.id,
+            title=task_in.title,
+            description=task_in.description,
+            status=task_in.status,
+            priority=task_in.priority,
+            due_date=task_in.due_date,
+        )
+        .returning(TaskDB)
     )
-    db.add(task)
-    db.commit()
-    db.refresh(task)
-
+    task = db.execute(stmt).scalar_one()
+    # сериализуем до commit: после него атрибуты expire'ятся
     data = TaskV2.from_orm(task).dict()
+    db.commit()
     save_idempotent_response(request, status.HTTP_201_CREATED, data)
     return data
 
@@ -93,22 +110,22 @@ def list_tasks_with_fields(
     if priority_filter:
         q = q.filter(TaskDB.priority == priority_filter)
 
-    tasks = (
+    q = (
         q.order_by(TaskDB.created_at.desc())
          .limit(limit)
          .offset(offset)
-         .all()
     )
-    
-    if not include:
-        return [TaskV2.from_orm(t).dict() for t in tasks]
 
-    requested_fields: Set[str] = {f.strip() for f in include.split(",") if f.strip()}
+    # datetime и enum orjson сериализует сам — отдаём Response напрямую,
+    # минуя повторный проход jsonable_encoder
+    if not include:
+        tasks = TASKS_V2_ADAPTER.validate_python(q.all(), from_attributes=True)
+        return ORJSONResponse(TASKS_V2_ADAPTER.dump_python(tasks))
 
-    result = []
-    for t in tasks:
-        full = TaskV2.from_orm(t).dict()
-        partial = {k: v for k, v in full.items() if k in requested_fields}
-        result.append(partial)
+    # выбираем из БД только запрошенные колонки, без сборки ORM-объектов
+    names = _parse_include(include)
+    if not names:
+        return ORJSONResponse([{} for _ in q.with_entities(TaskDB.id).all()])
 
-    return result
\ No newline at end of file
+    rows = q.with_entities(*(TASK_V2_COLUMNS[name] for name in names)).all()
+    return ORJSONResponse([dict(zip(names, row)) for row in rows])
@@ -22,6 +22,10 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    BCRYPT_COST: int = int(os.getenv("BCRYPT_COST", "12"))
+
+    REDIS_URL: str = os.getenv("REDIS_URL")
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 3600
     
     def __init__(self):
         required_vars = ["POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB", "SECRET_KEY"]
@@ -1,13 +1,53 @@
-from typing import Dict, Tuple, Optional
+import json
+import logging
+import threading
+from typing import Tuple, Optional
+
+from cachetools import TTLCache
 from fastapi import Request, HTTPException, status, Depends, Header
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 
 from app.api import deps
+from app.core.config import settings
+from app.core.redis_client import redis_client, async_redis_client, redis_errors
 from app.db.models import UserDB
 
+log = logging.getLogger(__name__)
+
+IDEMPOTENCY_STORE_MAX_SIZE = 10_000
+
 # ключ: (user_id, path, idem_key) -> (status_code, body)
-_idempotency_store: Dict[Tuple[int, str, str], Tuple[int, dict]] = {}
+# используется, если Redis не настроен или недоступен; старые ключи вытесняются по TTL/размеру
+_idempotency_store: "TTLCache[Tuple[int, str, str], Tuple[int, dict]]" = TTLCache(
+    maxsize=IDEMPOTENCY_STORE_MAX_SIZE,
+    ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+)
+# TTLCache не потокобезопасен, а сохранение идёт из threadpool
+_idempotency_lock = threading.Lock()
+
+
+def _redis_key(key: Tuple[int, str, str]) -> str:
+    user_id, path, idem_key = key
+    return f"idem:{user_id}:{path}:{idem_key}"
+
+
+async def _load_response(key: Tuple[int, str, str]) -> Optional[Tuple[int, dict]]:
+    # локальное хранилище смотрим всегда: туда попадают ответы, сохранённые во время сбоя Redis
+    with _idempotency_lock:
+        cached = _idempotency_store.get(key)
+    if cached is not None or async_redis_client is None:
+        return cached
+
+    try:
+        raw = await async_redis_client.get(_redis_key(key))
+    except redis_errors as e:
+        log.warning("redis idempotency lookup failed, using local store: %s", e)
+        return None
+    if raw is None:
+        return None
+    status_code, body = json.loads(raw)
+    return status_code, body
 
 
 async def idempotency_dependency(
@@ -24,10 +64,10 @@ async def idempotency_dependency(
 
     key = (current_user.id, request.url.path, idem_key)
 
-    if key in _idempotency_store:
-        status_code, body = _idempotency_store[key]
+    cached = await _load_response(key)
+    if cached is not None:
         request.state.idem_reused = True
-        request.state.idem_response = (status_code, body)
+        request.state.idem_response = cached
     else:
         request.state.idem_reused = False
         request.state.idem_key = key
@@ -39,4 +79,18 @@ def save_idempotent_response(request: Request, status_code: int, body: dict):
     key = getattr(request.state, "idem_key", None)
     if key:
         safe_body = jsonable_encoder(body)
-        _idempotency_store[key] = (status_code, safe_body)
\ No newline at end of file
+        if redis_client is not None:
+            # NX: первый сохранённый ответ побеждает, даже если воркеров несколько
+            try:
+                redis_client.set(
+                    _redis_key(key),
+                    json.dumps([status_code, safe_body]),
+                    nx=True,
+                    ex=settings.IDEMPOTENCY_TTL_SECONDS,
+                )
+                return
+            except redis_errors as e:
+                # запись в БД уже закоммичена: 500 здесь привёл бы к дублю при повторе клиента
+                log.warning("redis idempotency save failed, using local store: %s", e)
+        with _idempotency_lock:
+            _idempotency_store[key] = (status_code, safe_body)
\ No newline at end of file
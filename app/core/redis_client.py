@@ -0,0 +1,17 @@
+from app.core.config import settings
+
+# Redis опционален: без REDIS_URL лимиты и идемпотентность хранятся
+# в памяти процесса (корректно только при одном воркере uvicorn).
+redis_client = None
+async_redis_client = None
+# ошибки клиента Redis для except; пустой кортеж, пока Redis не настроен
+redis_errors: tuple = ()
+
+if settings.REDIS_URL:
+    import redis
+    import redis.asyncio
+
+    # синхронный клиент — для кода, который выполняется в threadpool (def-эндпоинты)
+    redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    async_redis_client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+    redis_errors = (redis.RedisError,)
@@ -3,7 +3,7 @@ from enum import Enum
 
 from sqlalchemy import (
     Column, Integer, String, DateTime,
-    ForeignKey, Text, Enum as SqlEnum
+    ForeignKey, Text, Index, Enum as SqlEnum
 )
 from sqlalchemy.orm import relationship
 
@@ -48,3 +48,11 @@ class TaskDB(Base):
     updated_at = Column(DateTime, default=datetime.utcnow)
 
     owner = relationship("UserDB", back_populates="tasks")
+
+    # все выборки задач идут по owner_id, списки — с сортировкой по created_at DESC
+    # (HTTP API) или id DESC (list_tasks в lab4)
+    __table_args__ = (
+        Index("ix_tasks_owner_created", "owner_id", created_at.desc()),
+        Index("ix_tasks_owner_id_desc", "owner_id", id.desc()),
+        Index("ix_tasks_owner_status_priority", "owner_id", "status", "priority"),
+    )
@@ -3,7 +3,9 @@ from sqlalchemy.orm import sessionmaker, declarative_base
 
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+# кэш скомпилированных запросов побольше дефолтных 500: каждая комбинация
+# include= в v2 даёт свою форму SELECT, и они не должны вытеснять друг друга
+engine = create_engine(settings.DATABASE_URL, query_cache_size=1200)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -1,5 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.db.session import Base, engine
 from app.api.v1 import router as v1_router
@@ -11,6 +12,7 @@ app = FastAPI(
     title="Task Manager API",
     version="1.0.0",
     description="Система задач с версионностью API и JWT-аутентификацией",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 from app.db.models import TaskStatus, TaskPriority
 
@@ -43,3 +43,7 @@ class TaskV2(TaskV1):
 
     class Config:
         from_attributes = True
+
+
+# валидирует и сериализует весь список за один проход в pydantic-core
+TASKS_V2_ADAPTER = TypeAdapter(List[TaskV2])
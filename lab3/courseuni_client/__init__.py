@@ -1,2 +1,3 @@
 from .client import CourseUniClient
+from .async_client import AsyncCourseUniClient
 from .exceptions import ApiError
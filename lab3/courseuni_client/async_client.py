@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Optional
+
+import httpx
+import orjson
+
+from .client import _api_error, _enrollment_payload
+from .params import query_params
+from .retry import RETRY_STATUSES, backoff_delay
+
+
+class AsyncCourseUniClient:
+    """
+    Асинхронный вариант CourseUniClient на httpx.AsyncClient.
+
+    Методы повторяют синхронный клиент, но возвращают корутины, поэтому
+    независимые запросы можно выполнять параллельно:
+
+        async with AsyncCourseUniClient(base_url, api_key) as c:
+            users, courses = await asyncio.gather(c.list_users_v2(), c.list_courses_v2())
+
+    Соединения переиспользуются из общего пула (keep-alive, HTTP/2).
+    """
+
+    def __init__(self, base_url: str, api_key: str, *, timeout: int = 15, max_retries_429: int = 3) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries_429 = max_retries_429
+
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "X-API-Key": self.api_key,
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            },
+            timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            http2=True,
+        )
+
+    async def __aenter__(self) -> "AsyncCourseUniClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    # --------------------- low-level ---------------------
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[dict[str, Any]] = None,
+        json_body: Any = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> Any:
+        # сериализуем один раз, на все повторы; Content-Type уже в заголовках клиента
+        content = orjson.dumps(json_body) if json_body is not None else None
+
+        attempt = 0
+        while True:
+            attempt += 1
+            resp = await self._client.request(
+                method,
+                path,
+                params=params,
+                content=content,
+                headers=headers,
+            )
+
+            # rate limiting / временные ошибки шлюза: повтор с backoff
+            if resp.status_code in RETRY_STATUSES and attempt <= self.max_retries_429:
+                await asyncio.sleep(backoff_delay(attempt, resp.headers.get("Retry-After")))
+                continue
+
+            # rate limiting (попытки исчерпаны) и прочие ошибки — как в синхронном клиенте
+            if resp.status_code >= 400:
+                raise _api_error(resp, method, self.base_url + path)
+
+            # no content
+            if resp.status_code == 204:
+                return None
+
+            # ok (json)
+            if resp.content:
+                try:
+                    return orjson.loads(resp.content)
+                except orjson.JSONDecodeError:
+                    return resp.text
+            return None
+
+    # --------------------- service endpoints ---------------------
+
+    async def health_v1(self) -> Any:
+        return await self._request("GET", "/api/v1/health")
+
+    # --------------------- v2 users ---------------------
+
+    async def list_users_v2(self, *, page: int | None = None, limit: int | None = None, include: str | None = None) -> Any:
+        params = query_params(page=page, limit=limit, include=include)
+        return await self._request("GET", "/api/v2/users", params=params)
+
+    async def create_user_v2(
+        self,
+        *,
+        first_name: str,
+        last_name: str,
+        email: str,
+        birthday: str | None = None,
+        bio: str | None = None,
+        role: str | None = None,
+    ) -> Any:
+        payload: dict[str, Any] = {
+            "firstName": first_name,
+            "lastName": last_name,
+            "email": email,
+        }
+        if birthday:
+            payload["birthday"] = birthday
+        if bio:
+            payload["bio"] = bio
+        if role:
+            payload["role"] = role
+        return await self._request("POST", "/api/v2/users", json_body=payload)
+
+    async def get_user_v2(self, user_id: str) -> Any:
+        return await self._request("GET", f"/api/v2/users/{user_id}")
+
+    async def patch_user_v2(self, user_id: str, **fields: Any) -> Any:
+        return await self._request("PATCH", f"/api/v2/users/{user_id}", json_body=fields)
+
+    async def delete_user_v2(self, user_id: str) -> None:
+        await self._request("DELETE", f"/api/v2/users/{user_id}")
+        return None
+
+    # --------------------- v2 courses ---------------------
+
+    async def list_courses_v2(
+        self,
+        *,
+        page: int | None = None,
+        limit: int | None = None,
+        include: str | None = None,
+        min_rating: float | None = None,
+        level: str | None = None,
+    ) -> Any:
+        params = query_params(page=page, limit=limit, include=include, min_rating=min_rating, level=level)
+        return await self._request("GET", "/api/v2/courses", params=params)
+
+    async def create_course_v2(
+        self,
+        *,
+        title: str,
+        description: str,
+        duration_hours: int,
+        rating: float | None = None,
+        level: str | None = None,
+    ) -> Any:
+        payload: dict[str, Any] = {
+            "title": title,
+            "description": description,
+            "durationHours": duration_hours,
+        }
+        if rating is not None:
+            payload["rating"] = rating
+        if level:
+            payload["level"] = level
+        return await self._request("POST", "/api/v2/courses", json_body=payload)
+
+    async def get_course_v2(self, course_id: str) -> Any:
+        return await self._request("GET", f"/api/v2/courses/{course_id}")
+
+    async def patch_course_v2(self, course_id: str, **fields: Any) -> Any:
+        return await self._request("PATCH", f"/api/v2/courses/{course_id}", json_body=fields)
+
+    async def delete_course_v2(self, course_id: str) -> None:
+        await self._request("DELETE", f"/api/v2/courses/{course_id}")
+        return None
+
+    # --------------------- v2 enrollments ---------------------
+
+    async def list_enrollments_v2(self, *, page: int | None = None, limit: int | None = None, include: str | None = None) -> Any:
+        params = query_params(page=page, limit=limit, include=include)
+        return await self._request("GET", "/api/v2/enrollments", params=params)
+
+    async def create_enrollment_v2(
+        self,
+        *,
+        user_id: str,
+        course_id: str,
+        status: str | None = None,
+        completion_percent: int | None = None,
+        idempotency_key: str | None = None,
+    ) -> Any:
+        payload = _enrollment_payload(user_id, course_id, status, completion_percent)
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        return await self._request("POST", "/api/v2/enrollments", json_body=payload, headers=headers)
+
+    async def get_enrollment_v2(self, enrollment_id: str) -> Any:
+        return await self._request("GET", f"/api/v2/enrollments/{enrollment_id}")
+
+    async def patch_enrollment_v2(self, enrollment_id: str, **fields: Any) -> Any:
+        return await self._request("PATCH", f"/api/v2/enrollments/{enrollment_id}", json_body=fields)
+
+    async def delete_enrollment_v2(self, enrollment_id: str) -> None:
+        await self._request("DELETE", f"/api/v2/enrollments/{enrollment_id}")
+        return None
+
+    # --------------------- v2 internal ---------------------
+
+    async def stats_v2(self) -> Any:
+        return await self._request("GET", "/api/v2/internal/stats")
@@ -1,11 +1,25 @@
 from __future__ import annotations
 
+import hashlib
 import time
-from typing import Any, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, Optional
 
+import httpx
+import ijson
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 
 from .exceptions import ApiError
+from .params import query_params
+from .retry import RETRY_STATUSES, backoff_delay
+
+# сколько POST'ов параллельно, если сервер не умеет bulk-эндпоинт
+BULK_FALLBACK_WORKERS = 16
 
 
 class CourseUniClient:
@@ -17,127 +31,266 @@ class CourseUniClient:
     - обработка rate limit (429 + Retry-After)
     - поддержка идемпотентности (Idempotency-Key для POST /enrollments)
     - базовые CRUD операции + пагинация (page/limit) + include=field1,field2 (v2)
+    - кэш GET-ответов с условными запросами (ETag / Last-Modified -> 304)
+    - transport="httpx": HTTP/2 через httpx.Client — запросы из нескольких потоков
+      мультиплексируются в одном соединении вместо отдельного сокета на каждый
     """
 
-    def __init__(self, base_url: str, api_key: str, *, timeout: int = 15, max_retries_429: int = 3) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        *,
+        timeout: int = 15,
+        max_retries_429: int = 3,
+        cache_size: int = 256,
+        transport: str = "requests",
+        warmup: bool = False,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.timeout = timeout
         self.max_retries_429 = max_retries_429
 
-        self.session = requests.Session()
-        self.session.headers.update({
+        # (url, params) -> (etag, last_modified, body); LRU для GET-запросов
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, tuple[Optional[str], Optional[str], Any]] = OrderedDict()
+
+        default_headers = {
             "X-API-Key": self.api_key,
             "Content-Type": "application/json",
             "Accept": "application/json",
-        })
+        }
+
+        self.transport = transport
+        self._httpx = transport == "httpx"
+        if self._httpx:
+            # ошибки соединения повторяет сам транспорт, 429/5xx — _request (с jitter)
+            self.session = httpx.Client(
+                headers=default_headers,
+                timeout=timeout,
+                transport=httpx.HTTPTransport(
+                    http2=True,
+                    retries=3,
+                    limits=httpx.Limits(max_keepalive_connections=10),
+                ),
+            )
+        elif transport == "requests":
+            self.session = requests.Session()
+            # пул побольше, чтобы при пачке запросов не закрывать тёплые соединения;
+            # urllib3 повторяет только ошибки соединения, 429/5xx обрабатываем сами (с jitter)
+            retry = Retry(
+                total=None,
+                connect=3,
+                read=0,
+                redirect=0,
+                status=0,
+                backoff_factor=0,
+                respect_retry_after_header=False,
+            )
+            adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50, pool_block=False, max_retries=retry)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self.session.headers.update(default_headers)
+            # br/zstd urllib3 добавляет сюда сам, если стоят brotli и backports.zstd;
+            # requests сам по себе (в старых версиях) просит только gzip, deflate
+            self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        else:
+            raise ValueError(f"unknown transport: {transport!r}")
+
+        # URL ресурсов собираем один раз, а не на каждый вызов
+        self._u_health = self.base_url + "/api/v1/health"
+        self._u_users = self.base_url + "/api/v2/users"
+        self._u_courses = self.base_url + "/api/v2/courses"
+        self._u_enrollments = self.base_url + "/api/v2/enrollments"
+        self._u_enrollments_bulk = self.base_url + "/api/v2/enrollments:bulk"
+        # None — ещё не знаем, есть ли на сервере bulk-эндпоинт
+        self._bulk_enrollments: Optional[bool] = None
+        self._u_stats = self.base_url + "/api/v2/internal/stats"
+
+        # последним: к этому моменту объект полностью собран
+        if warmup:
+            self.warmup()
 
     # --------------------- low-level ---------------------
 
-    def _url(self, path: str) -> str:
-        if not path.startswith("/"):
-            path = "/" + path
-        return self.base_url + path
+    def close(self) -> None:
+        self.session.close()
+
+    def warmup(self) -> None:
+        """
+        Заранее открыть соединение (DNS + TCP + TLS) дешёвым запросом к health,
+        чтобы первый настоящий вызов ушёл по уже тёплому соединению из пула.
+        Ошибки игнорируются: это только оптимизация.
+        """
+        try:
+            self.session.get(self._u_health, timeout=self.timeout).close()
+        except (requests.RequestException, httpx.HTTPError):
+            pass
+
+    def invalidate(self, path_prefix: str) -> None:
+        """Сбросить закэшированные GET-ответы, URL которых начинается с path_prefix."""
+        # все пути в клиенте начинаются с "/", base_url хранится без хвостового "/"
+        assert path_prefix.startswith("/"), path_prefix
+        self._invalidate_url(self.base_url + path_prefix)
+
+    def _invalidate_url(self, url_prefix: str) -> None:
+        for key in [k for k in self._cache if k[0].startswith(url_prefix)]:
+            del self._cache[key]
 
     def _request(
         self,
         method: str,
-        path: str,
+        url: str,
         *,
         params: Optional[dict[str, Any]] = None,
         json_body: Any = None,
         headers: Optional[dict[str, str]] = None,
     ) -> Any:
-        url = self._url(path)
-
-        extra_headers: dict[str, str] = {}
-        if headers:
-            extra_headers.update(headers)
+        # url — уже полный адрес; словарь заголовков копируем, только если его нужно дополнить
+        extra_headers = headers
+
+        cache_key = None
+        cached = None
+        if method == "GET" and self.cache_size > 0:
+            cache_key = (url, tuple(sorted(params.items())) if params else ())
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                etag, last_modified, _ = cached
+                extra_headers = dict(headers) if headers else {}
+                if etag:
+                    extra_headers["If-None-Match"] = etag
+                if last_modified:
+                    extra_headers["If-Modified-Since"] = last_modified
+
+        # сериализуем один раз (orjson сразу отдаёт UTF-8 bytes); Content-Type уже в заголовках сессии
+        data = orjson.dumps(json_body) if json_body is not None else None
 
         attempt = 0
         while True:
             attempt += 1
-            resp = self.session.request(
-                method,
-                url,
-                params=params,
-                json=json_body,
-                headers=extra_headers,
-                timeout=self.timeout,
-            )
+            if self._httpx:
+                resp = self.session.request(method, url, params=params, content=data, headers=extra_headers)
+            else:
+                resp = self.session.request(
+                    method,
+                    url,
+                    params=params,
+                    data=data,
+                    headers=extra_headers,
+                    timeout=self.timeout,
+                )
 
-            # rate limiting
-            if resp.status_code == 429:
-                if attempt > self.max_retries_429:
-                    raise ApiError(
-                        status_code=429,
-                        message="Too Many Requests (rate limit exceeded)",
-                        details={"retry_after": resp.headers.get("Retry-After")},
-                        url=url,
-                        method=method,
-                        headers=dict(resp.headers),
-                        response_text=resp.text,
-                    )
-                retry_after = resp.headers.get("Retry-After", "1")
-                try:
-                    wait_s = int(retry_after)
-                except ValueError:
-                    wait_s = 1
-                time.sleep(max(wait_s, 1))
+            # rate limiting / временные ошибки шлюза: повтор с backoff
+            if resp.status_code in RETRY_STATUSES and attempt <= self.max_retries_429:
+                time.sleep(backoff_delay(attempt, resp.headers.get("Retry-After")))
                 continue
 
             # no content
             if resp.status_code == 204:
                 return None
 
-            # errors
+            # не изменилось — отдаём сохранённое тело без повторного разбора
+            if resp.status_code == 304 and cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached[2]
+
+            # errors (в т.ч. 429, если попытки исчерпаны)
             if resp.status_code >= 400:
-                details = None
-                message = resp.reason or "Request failed"
-                try:
-                    details = resp.json()
-                    # часто API кладет текст ошибки в поля error/detail/message
-                    if isinstance(details, dict):
-                        message = details.get("error") or details.get("detail") or details.get("message") or message
-                except Exception:
-                    details = None
-
-                raise ApiError(
-                    status_code=resp.status_code,
-                    message=message,
-                    details=details,
-                    url=url,
-                    method=method,
-                    headers=dict(resp.headers),
-                    response_text=resp.text,
-                )
+                raise _api_error(resp, method, url)
 
             # ok (json)
+            body = None
             if resp.content:
                 try:
-                    return resp.json()
-                except Exception:
+                    body = orjson.loads(resp.content)
+                except orjson.JSONDecodeError:
                     # если вдруг вернули не-json
-                    return resp.text
-            return None
+                    body = resp.text
+
+            if cache_key is not None:
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+                if etag or last_modified:
+                    self._cache[cache_key] = (etag, last_modified, body)
+                    self._cache.move_to_end(cache_key)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+            return body
+
+    def _request_stream(self, method: str, url: str, params: Optional[dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Потоковый вариант _request для списков: элементы массива "data" разбираются
+        ijson по мере чтения сокета и отдаются по одному, тело целиком в память не попадает.
+        Кэш ETag здесь не используется.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if self._httpx:
+                resp = self.session.send(self.session.build_request(method, url, params=params), stream=True)
+            else:
+                resp = self.session.request(method, url, params=params, timeout=self.timeout, stream=True)
+            if resp.status_code in RETRY_STATUSES and attempt <= self.max_retries_429:
+                resp.close()
+                time.sleep(backoff_delay(attempt, resp.headers.get("Retry-After")))
+                continue
+            if resp.status_code >= 400:
+                if self._httpx:
+                    resp.read()
+                raise _api_error(resp, method, url)
+            break
+
+        if self._httpx:
+            # у httpx нет file-like raw: скармливаем ijson распакованные чанки через push-интерфейс
+            try:
+                items = ijson.sendable_list()
+                parser = ijson.items_coro(items, "data.item", use_float=True)
+                for chunk in resp.iter_bytes():
+                    parser.send(chunk)
+                    yield from items
+                    del items[:]
+                parser.close()
+                yield from items
+            finally:
+                resp.close()
+            return
+
+        with resp:
+            # gzip/deflate распаковывает urllib3, ijson читает уже чистый JSON
+            resp.raw.decode_content = True
+            yield from ijson.items(resp.raw, "data.item", use_float=True)
+
+    def _iter_pages(self, url: str, params: dict[str, Any], limit: int) -> Iterator[Any]:
+        # страницы запрашиваются по мере потребления; конец — пустая страница.
+        # По "короткой" странице судить нельзя: сервер может урезать limit до своего максимума
+        page = 1
+        while True:
+            empty = True
+            for item in self._request_stream("GET", url, {**params, "page": page, "limit": limit}):
+                empty = False
+                yield item
+            if empty:
+                return
+            page += 1
 
     # --------------------- service endpoints ---------------------
 
     def health_v1(self) -> Any:
         # этот эндпоинт в README отмечен как публичный
-        return self._request("GET", "/api/v1/health")
+        return self._request("GET", self._u_health)
 
     # --------------------- v2 users ---------------------
 
     def list_users_v2(self, *, page: int | None = None, limit: int | None = None, include: str | None = None) -> Any:
-        params: dict[str, Any] = {}
-        if page is not None:
-            params["page"] = page
-        if limit is not None:
-            params["limit"] = limit
-        if include:
-            params["include"] = include
-        return self._request("GET", "/api/v2/users", params=params)
+        params = query_params(page=page, limit=limit, include=include)
+        return self._request("GET", self._u_users, params=params)
+
+    def iter_users_v2(self, *, limit: int = 100, include: str | None = None) -> Iterator[Any]:
+        """Все пользователи по одному, с автоматической пагинацией."""
+        params = query_params(include=include)
+        return self._iter_pages(self._u_users, params, limit)
 
     def create_user_v2(
         self,
@@ -160,17 +313,22 @@ class CourseUniClient:
             payload["bio"] = bio
         if role:
             payload["role"] = role
-        return self._request("POST", "/api/v2/users", json_body=payload)
+        result = self._request("POST", self._u_users, json_body=payload)
+        self._invalidate_url(self._u_users)
+        return result
 
     def get_user_v2(self, user_id: str) -> Any:
-        return self._request("GET", f"/api/v2/users/{user_id}")
+        return self._request("GET", f"{self._u_users}/{user_id}")
 
     def patch_user_v2(self, user_id: str, **fields: Any) -> Any:
         # fields: firstName, lastName, email, birthday, bio, role
-        return self._request("PATCH", f"/api/v2/users/{user_id}", json_body=fields)
+        result = self._request("PATCH", f"{self._u_users}/{user_id}", json_body=fields)
+        self._invalidate_url(self._u_users)
+        return result
 
     def delete_user_v2(self, user_id: str) -> None:
-        self._request("DELETE", f"/api/v2/users/{user_id}")
+        self._request("DELETE", f"{self._u_users}/{user_id}")
+        self._invalidate_url(self._u_users)
         return None
 
     # --------------------- v2 courses ---------------------
@@ -184,18 +342,20 @@ class CourseUniClient:
         min_rating: float | None = None,
         level: str | None = None,
     ) -> Any:
-        params: dict[str, Any] = {}
-        if page is not None:
-            params["page"] = page
-        if limit is not None:
-            params["limit"] = limit
-        if include:
-            params["include"] = include
-        if min_rating is not None:
-            params["minRating"] = min_rating
-        if level:
-            params["level"] = level
-        return self._request("GET", "/api/v2/courses", params=params)
+        params = query_params(page=page, limit=limit, include=include, min_rating=min_rating, level=level)
+        return self._request("GET", self._u_courses, params=params)
+
+    def iter_courses_v2(
+        self,
+        *,
+        limit: int = 100,
+        include: str | None = None,
+        min_rating: float | None = None,
+        level: str | None = None,
+    ) -> Iterator[Any]:
+        """Все курсы по одному, с автоматической пагинацией."""
+        params = query_params(include=include, min_rating=min_rating, level=level)
+        return self._iter_pages(self._u_courses, params, limit)
 
     def create_course_v2(
         self,
@@ -215,30 +375,34 @@ class CourseUniClient:
             payload["rating"] = rating
         if level:
             payload["level"] = level
-        return self._request("POST", "/api/v2/courses", json_body=payload)
+        result = self._request("POST", self._u_courses, json_body=payload)
+        self._invalidate_url(self._u_courses)
+        return result
 
     def get_course_v2(self, course_id: str) -> Any:
-        return self._request("GET", f"/api/v2/courses/{course_id}")
+        return self._request("GET", f"{self._u_courses}/{course_id}")
 
     def patch_course_v2(self, course_id: str, **fields: Any) -> Any:
         # fields: title, description, durationHours, rating, level
-        return self._request("PATCH", f"/api/v2/courses/{course_id}", json_body=fields)
+        result = self._request("PATCH", f"{self._u_courses}/{course_id}", json_body=fields)
+        self._invalidate_url(self._u_courses)
+        return result
 
     def delete_course_v2(self, course_id: str) -> None:
-        self._request("DELETE", f"/api/v2/courses/{course_id}")
+        self._request("DELETE", f"{self._u_courses}/{course_id}")
+        self._invalidate_url(self._u_courses)
         return None
 
     # --------------------- v2 enrollments ---------------------
 
     def list_enrollments_v2(self, *, page: int | None = None, limit: int | None = None, include: str | None = None) -> Any:
-        params: dict[str, Any] = {}
-        if page is not None:
-            params["page"] = page
-        if limit is not None:
-            params["limit"] = limit
-        if include:
-            params["include"] = include
-        return self._request("GET", "/api/v2/enrollments", params=params)
+        params = query_params(page=page, limit=limit, include=include)
+        return self._request("GET", self._u_enrollments, params=params)
+
+    def iter_enrollments_v2(self, *, limit: int = 100, include: str | None = None) -> Iterator[Any]:
+        """Все записи на курсы по одной, с автоматической пагинацией."""
+        params = query_params(include=include)
+        return self._iter_pages(self._u_enrollments, params, limit)
 
     def create_enrollment_v2(
         self,
@@ -249,30 +413,130 @@ class CourseUniClient:
         completion_percent: int | None = None,
         idempotency_key: str | None = None,
     ) -> Any:
-        payload: dict[str, Any] = {"userId": user_id, "courseId": course_id}
-        if status:
-            payload["status"] = status
-        if completion_percent is not None:
-            payload["completionPercent"] = completion_percent
-
-        headers: dict[str, str] = {}
-        if idempotency_key:
-            headers["Idempotency-Key"] = idempotency_key
-
-        return self._request("POST", "/api/v2/enrollments", json_body=payload, headers=headers)
+        payload = _enrollment_payload(user_id, course_id, status, completion_percent)
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        result = self._request("POST", self._u_enrollments, json_body=payload, headers=headers)
+        self._invalidate_url(self._u_enrollments)
+        return result
+
+    def create_enrollments_bulk_v2(self, items: list[dict[str, Any]], *, chunk: int = 100) -> list[Any]:
+        """
+        Массовое создание записей: items — словари с ключами как у create_enrollment_v2
+        (user_id, course_id, status, completion_percent).
+
+        Пачки по chunk штук уходят в POST /api/v2/enrollments:bulk. Если сервер такого
+        эндпоинта не знает (404/405), записи создаются обычными POST'ами параллельно.
+        Idempotency-Key считается от содержимого пачки/записи, поэтому повторный
+        импорт тех же данных не создаёт дублей.
+        """
+        payloads = [
+            _enrollment_payload(i["user_id"], i["course_id"], i.get("status"), i.get("completion_percent"))
+            for i in items
+        ]
+        results: list[Any] = []
+        try:
+            for start in range(0, len(payloads), chunk):
+                part = payloads[start:start + chunk]
+                if self._bulk_enrollments is not False:
+                    try:
+                        result = self._request(
+                            "POST",
+                            self._u_enrollments_bulk,
+                            json_body=part,
+                            headers={"Idempotency-Key": _payload_key(part)},
+                        )
+                        self._bulk_enrollments = True
+                        results.extend(result["data"] if isinstance(result, dict) else result)
+                        continue
+                    except ApiError as e:
+                        if e.status_code not in (404, 405) or self._bulk_enrollments:
+                            raise
+                        self._bulk_enrollments = False
+
+                with ThreadPoolExecutor(max_workers=min(BULK_FALLBACK_WORKERS, len(part))) as ex:
+                    results.extend(ex.map(self._post_enrollment, part))
+        finally:
+            self._invalidate_url(self._u_enrollments)
+        return results
+
+    def _post_enrollment(self, payload: dict[str, Any]) -> Any:
+        return self._request(
+            "POST",
+            self._u_enrollments,
+            json_body=payload,
+            headers={"Idempotency-Key": _payload_key(payload)},
+        )
 
     def get_enrollment_v2(self, enrollment_id: str) -> Any:
-        return self._request("GET", f"/api/v2/enrollments/{enrollment_id}")
+        return self._request("GET", f"{self._u_enrollments}/{enrollment_id}")
 
     def patch_enrollment_v2(self, enrollment_id: str, **fields: Any) -> Any:
         # fields: status, completionPercent
-        return self._request("PATCH", f"/api/v2/enrollments/{enrollment_id}", json_body=fields)
+        result = self._request("PATCH", f"{self._u_enrollments}/{enrollment_id}", json_body=fields)
+        self._invalidate_url(self._u_enrollments)
+        return result
 
     def delete_enrollment_v2(self, enrollment_id: str) -> None:
-        self._request("DELETE", f"/api/v2/enrollments/{enrollment_id}")
+        self._request("DELETE", f"{self._u_enrollments}/{enrollment_id}")
+        self._invalidate_url(self._u_enrollments)
         return None
 
     # --------------------- v2 internal (не обязателен, но полезен для демо) ---------------------
 
     def stats_v2(self) -> Any:
-        return self._request("GET", "/api/v2/internal/stats")
+        return self._request("GET", self._u_stats)
+
+
+def _api_error(resp: requests.Response | httpx.Response, method: str, url: str) -> ApiError:
+    """ApiError по ответу с ошибкой; общий для синхронного и асинхронного клиента."""
+    # rate limiting: попытки исчерпаны
+    if resp.status_code == 429:
+        return ApiError(
+            status_code=429,
+            message="Too Many Requests (rate limit exceeded)",
+            details={"retry_after": resp.headers.get("Retry-After")},
+            url=url,
+            method=method,
+            headers=resp.headers,
+            content=resp.content,
+        )
+
+    details = None
+    reason = resp.reason_phrase if isinstance(resp, httpx.Response) else resp.reason
+    message = reason or "Request failed"
+    try:
+        details = orjson.loads(resp.content)
+        # часто API кладет текст ошибки в поля error/detail/message
+        if isinstance(details, dict):
+            message = details.get("error") or details.get("detail") or details.get("message") or message
+    except orjson.JSONDecodeError:
+        details = None
+
+    return ApiError(
+        status_code=resp.status_code,
+        message=message,
+        details=details,
+        url=url,
+        method=method,
+        headers=resp.headers,
+        content=resp.content,
+    )
+
+
+def _enrollment_payload(
+    user_id: str,
+    course_id: str,
+    status: str | None,
+    completion_percent: int | None,
+) -> dict[str, Any]:
+    payload: dict[str, Any] = {"userId": user_id, "courseId": course_id}
+    if status:
+        payload["status"] = status
+    if completion_percent is not None:
+        payload["completionPercent"] = completion_percent
+    return payload
+
+
+def _payload_key(payload: Any) -> str:
+    # одинаковые данные -> одинаковый ключ (порядок полей в словарях не важен)
+    return hashlib.blake2b(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
@@ -1,18 +1,49 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, Mapping, Optional
 
 
-@dataclass
 class ApiError(Exception):
-    status_code: int
-    message: str
-    details: Any = None
-    url: Optional[str] = None
-    method: Optional[str] = None
-    headers: Optional[dict[str, str]] = None
-    response_text: Optional[str] = None
+    """
+    Ошибка ответа API.
+
+    headers — заголовки ответа как есть (case-insensitive mapping из requests/httpx),
+    тело хранится байтами и декодируется в response_text только при обращении.
+    """
+
+    __slots__ = ("status_code", "message", "details", "url", "method", "headers", "_content", "_response_text")
+
+    def __init__(
+        self,
+        status_code: int,
+        message: str,
+        details: Any = None,
+        url: Optional[str] = None,
+        method: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        response_text: Optional[str] = None,
+        *,
+        content: Optional[bytes] = None,
+    ) -> None:
+        super().__init__(status_code, message)
+        self.status_code = status_code
+        self.message = message
+        self.details = details
+        self.url = url
+        self.method = method
+        self.headers = headers
+        self._content = content
+        self._response_text = response_text
+
+    @property
+    def response_text(self) -> Optional[str]:
+        if self._response_text is None and self._content is not None:
+            self._response_text = self._content.decode("utf-8", errors="replace")
+        return self._response_text
+
+    def headers_dict(self) -> dict[str, str]:
+        """Копия заголовков обычным dict — например, для логирования в JSON."""
+        return dict(self.headers) if self.headers else {}
 
     def __str__(self) -> str:
         base = f"API error {self.status_code}: {self.message}"
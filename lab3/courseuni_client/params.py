@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from typing import Any
+
+# имена аргументов методов клиента -> имена query-параметров API (где они отличаются)
+QUERY_NAMES = {"min_rating": "minRating"}
+
+
+def query_params(**values: Any) -> dict[str, Any]:
+    """Query-параметры из аргументов метода; None и пустые строки не отправляются."""
+    return {QUERY_NAMES.get(k, k): v for k, v in values.items() if v is not None and v != ""}
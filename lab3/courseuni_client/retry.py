@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+BACKOFF_BASE_S = 1.0
+BACKOFF_CAP_S = 30.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After бывает числом секунд или HTTP-датой."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Экспоненциальная задержка с full jitter: uniform(0, min(cap, base * 2^(attempt-1))).
+
+    Случайный разброс не даёт клиентам, упёршимся в один лимит, повторять
+    запросы синхронно. Retry-After от сервера используется как нижняя граница.
+    """
+    expo = min(BACKOFF_CAP_S, BACKOFF_BASE_S * (2 ** (attempt - 1)))
+    wait_s = random.random() * expo
+    server_wait = parse_retry_after(retry_after)
+    if server_wait is not None:
+        wait_s = max(wait_s, server_wait)
+    return wait_s
@@ -1,77 +1,112 @@
-import json
-import uuid
 import time
+import uuid
+from concurrent.futures import Future
 
+import orjson
 import pika
 
-from lab4.mq_common import MQSettings, connect, declare_topology
-
-
-def rpc_call(
-    ch, conn, s: MQSettings,
-    version: str, action: str, data: dict,
-    auth: str, timeout_s: int,
-    request_id: str | None = None,
-):
-    req_id = request_id or str(uuid.uuid4())
-    req = {
-        "id": req_id,
-        "version": version,
-        "action": action,
-        "data": data,
-        "auth": auth,
-    }
-
-    result = {"resp": None}
-
-    # reply queue (эксклюзивная)
-    q = ch.queue_declare(queue="", exclusive=True)
-    reply_queue = q.method.queue
-
-    def on_resp(ch_, method, props, body):
-        if props.correlation_id == req_id:
-            result["resp"] = json.loads(body.decode("utf-8"))
-
-    ch.basic_consume(queue=reply_queue, on_message_callback=on_resp, auto_ack=True)
-
-    ch.basic_publish(
-        exchange=s.exchange,
-        routing_key=s.requests_rk,
-        properties=pika.BasicProperties(
-            correlation_id=req_id,
-            reply_to=reply_queue,
-            delivery_mode=2,
-            content_type="application/json",
-        ),
-        body=json.dumps(req, ensure_ascii=False).encode("utf-8"),
-    )
-
-    start = time.time()
-    while result["resp"] is None and (time.time() - start) < timeout_s:
-        conn.process_data_events(time_limit=0.5)
-
-    return result["resp"]
+from lab4.mq_common import MQSettings, connect, ensure_topology
+
+
+class RpcClient:
+    """
+    RPC поверх RabbitMQ: ответы приходят через Direct Reply-To (s.direct_reply_to),
+    consumer создаётся один раз на клиента, ответы раскладываются по correlation_id
+    в Future ожидающих вызовов.
+    """
+
+    def __init__(self, conn, ch, s: MQSettings):
+        self.conn = conn
+        self.ch = ch
+        self.s = s
+        self.pending: dict[str, Future] = {}
+
+        # псевдо-очередь: queue_declare не нужен, но подписаться надо до первой публикации
+        self.reply_queue = s.direct_reply_to
+        ch.basic_consume(queue=self.reply_queue, on_message_callback=self._on_resp, auto_ack=True)
+
+    def _on_resp(self, ch_, method, props, body):
+        fut = self.pending.pop(props.correlation_id, None)
+        # ответ на вызов, который уже отвалился по таймауту — просто выбрасываем
+        if fut is not None:
+            fut.set_result(orjson.loads(body))
+
+    def submit(
+        self,
+        version: str, action: str, data: dict,
+        auth: str,
+        request_id: str | None = None,
+    ) -> Future:
+        """Отправить запрос, не дожидаясь ответа; результат — через gather()."""
+        req_id = request_id or str(uuid.uuid4())
+        req = {
+            "id": req_id,
+            "version": version,
+            "action": action,
+            "data": data,
+            "auth": auth,
+        }
+
+        fut: Future = Future()
+        self.pending[req_id] = fut
+
+        self.ch.basic_publish(
+            exchange=self.s.exchange,
+            routing_key=self.s.requests_rk,
+            properties=pika.BasicProperties(
+                correlation_id=req_id,
+                reply_to=self.reply_queue,
+                # RPC-запрос живёт, пока клиент ждёт ответ: на диск его не пишем
+                delivery_mode=1,
+                content_type="application/json",
+            ),
+            body=orjson.dumps(req),
+        )
+        return fut
+
+    def gather(self, futures: list[Future], timeout_s: int) -> list:
+        """Дождаться ответов на отправленные запросы; на таймауте вместо ответа None."""
+        # BlockingConnection не потокобезопасна, поэтому вместо fut.result(timeout)
+        # крутим I/O сами; process_data_events возвращается сразу, как только пришёл ответ
+        deadline = time.monotonic() + timeout_s
+        while not all(f.done() for f in futures):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                waiting = set(f for f in futures if not f.done())
+                for req_id in [k for k, f in self.pending.items() if f in waiting]:
+                    del self.pending[req_id]
+                break
+            self.conn.process_data_events(time_limit=remaining)
+
+        return [f.result() if f.done() else None for f in futures]
+
+    def call(
+        self,
+        version: str, action: str, data: dict,
+        auth: str, timeout_s: int,
+        request_id: str | None = None,
+    ):
+        fut = self.submit(version, action, data, auth, request_id=request_id)
+        return self.gather([fut], timeout_s)[0]
 
 
 def main():
     s = MQSettings()
 
     conn = connect(s)
-    ch = conn.channel()
-    declare_topology(ch, s)
-
-    # 1) health_check
-    r1 = rpc_call(ch, conn, s, "v1", "health_check", {}, auth="", timeout_s=s.rpc_timeout_s)
-    print("1) health_check:", r1)
-
-    # retry demo (только если добавила simulate_temp_error в воркер)
-    tmp = rpc_call(
-        ch, conn, s,
-        "v1", "health_check",
-        {"simulate_temp_error": True},
-        auth="",
-        timeout_s=s.rpc_timeout_s
+    ch = ensure_topology(conn, conn.channel(), s)
+    rpc = RpcClient(conn, ch, s)
+
+    # 1) health_check + retry demo (только если добавила simulate_temp_error в воркер).
+    # Независимые запросы отправляем пачкой и ждём ответы вместе
+    r1, tmp = rpc.gather(
+        [
+            rpc.submit("v1", "health_check", {}, auth=""),
+            rpc.submit("v1", "health_check", {"simulate_temp_error": True}, auth=""),
+        ],
+        timeout_s=s.rpc_timeout_s,
     )
+    print("1) health_check:", r1)
     print("simulate retry:", tmp)
 
     # создадим уникального юзера
@@ -80,8 +115,7 @@ def main():
     full_name = "Vika Student"
 
     # 2) register
-    r2 = rpc_call(
-        ch, conn, s,
+    r2 = rpc.call(
         "v1", "register",
         {"email": email, "password": password, "full_name": full_name},
         auth="",
@@ -90,8 +124,7 @@ def main():
     print("2) register:", r2)
 
     # 3) login
-    r3 = rpc_call(
-        ch, conn, s,
+    r3 = rpc.call(
         "v1", "login",
         {"email": email, "password": password},
         auth="",
@@ -107,44 +140,40 @@ def main():
         print("No token, stop.")
         return
 
-    # 4) create_task v1
-    r4 = rpc_call(
-        ch, conn, s,
-        "v1", "create_task",
-        {"title": "Buy milk", "description": "demo task", "due_date": None},
-        auth=token,
-        timeout_s=s.rpc_timeout_s
+    same_id = "IDEMPOTENCY-DEMO-123"
+
+    # 4) create_task v1, вторая задача и первый запрос с фиксированным id друг от друга не зависят
+    r4, r4a, r4b = rpc.gather(
+        [
+            rpc.submit(
+                "v1", "create_task",
+                {"title": "Buy milk", "description": "demo task", "due_date": None},
+                auth=token,
+            ),
+            rpc.submit(
+                "v1", "create_task",
+                {"title": "Idem task", "description": "should not duplicate"},
+                auth=token,
+            ),
+            rpc.submit(
+                "v1", "create_task",
+                {"title": "Idem task", "description": "should not duplicate"},
+                auth=token,
+                request_id=same_id,
+            ),
+        ],
+        timeout_s=s.rpc_timeout_s,
     )
     print("4) create_task v1:", r4)
+    print("create_task (first):", r4a)
 
     task_id = None
     if r4 and r4.get("status") == "ok":
         task_id = r4["data"]["id"]
 
-
-    same_id = "IDEMPOTENCY-DEMO-123"
-
-    r4a = rpc_call(
-        ch, conn, s,
-        "v1", "create_task",
-        {"title": "Idem task", "description": "should not duplicate"},
-        auth=token,
-        timeout_s=s.rpc_timeout_s
-    )
-    print("create_task (first):", r4a)
-
-    # повторим тот же запрос, но с тем же id
-    # Для этого rpc_call надо уметь принимать request_id (добавь параметр в функцию)
-    r4b = rpc_call(
-        ch, conn, s,
-        "v1", "create_task",
-        {"title": "Idem task", "description": "should not duplicate"},
-        auth=token,
-        timeout_s=s.rpc_timeout_s,
-        request_id=same_id
-    )
-    r4c = rpc_call(
-        ch, conn, s,
+    # повторим тот же запрос с тем же id — только после ответа на первый,
+    # иначе оба могут оказаться в обработке одновременно
+    r4c = rpc.call(
         "v1", "create_task",
         {"title": "Idem task", "description": "should not duplicate"},
         auth=token,
@@ -154,23 +183,21 @@ def main():
     print("create_task (idem #1):", r4b)
     print("create_task (idem #2):", r4c)
 
-    # 5) list_tasks
-    r5 = rpc_call(ch, conn, s, "v1", "list_tasks", {}, auth=token, timeout_s=s.rpc_timeout_s)
-    print("5) list_tasks:", r5)
-
-    # 6) update_task v2 (с приоритетом)
+    # 5) list_tasks, 6) update_task v2 (с приоритетом) и DLQ demo — тоже одной пачкой
+    batch = [
+        rpc.submit("v1", "list_tasks", {}, auth=token),
+        rpc.submit("v1", "abracadabra", {}, auth=token),
+    ]
     if task_id:
-        r6 = rpc_call(
-            ch, conn, s,
+        batch.append(rpc.submit(
             "v2", "update_task",
             {"task_id": task_id, "priority": "high", "status": "in_progress"},
             auth=token,
-            timeout_s=s.rpc_timeout_s
-        )
-        print("6) update_task v2:", r6)
-
-    # DLQ demo
-    bad = rpc_call(ch, conn, s, "v1", "abracadabra", {}, auth=token, timeout_s=s.rpc_timeout_s)
+        ))
+    r5, bad, *r6 = rpc.gather(batch, timeout_s=s.rpc_timeout_s)
+    print("5) list_tasks:", r5)
+    if r6:
+        print("6) update_task v2:", r6[0])
     print("bad action:", bad)
 
 
@@ -2,6 +2,10 @@ import os
 from dataclasses import dataclass
 
 import pika
+import pika.exceptions
+
+# (host, port, vhost, exchange), для которых топология уже объявлена в этом процессе
+_declared: set[tuple[str, int, str, str]] = set()
 
 
 @dataclass(frozen=True)
@@ -28,10 +32,24 @@ class MQSettings:
     dlq_queue: str = "api.requests.dlq"
     dlq_rk: str = "api.requests.dlq"
 
+    # Direct Reply-To: клиент до публикации запроса подписывается на эту псевдо-очередь
+    # (basic_consume с auto_ack=True) и указывает её в reply_to; брокер не создаёт
+    # под ответы настоящую очередь. Воркер отвечает на reply_to как есть.
+    direct_reply_to: str = "amq.rabbitmq.reply-to"
+
     retry_delay_ms: int = int(os.getenv("MQ_RETRY_DELAY_MS", "5000"))  # 5 сек
     max_retries: int = int(os.getenv("MQ_MAX_RETRIES", "3"))
     rpc_timeout_s: int = int(os.getenv("MQ_RPC_TIMEOUT_S", "30"))
 
+    # сколько неподтверждённых сообщений брокер отдаёт воркеру заранее
+    prefetch_count: int = int(os.getenv("MQ_PREFETCH", "64"))
+    # ack'и копятся и уходят одним basic_ack(multiple=True): по числу или по таймеру
+    ack_batch_size: int = int(os.getenv("MQ_ACK_BATCH", "16"))
+    ack_flush_interval_s: float = float(os.getenv("MQ_ACK_FLUSH_S", "0.2"))
+    # publisher confirms для retry/DLQ: запрос подтверждается только после того,
+    # как брокер принял его копию; ответы клиентам идут без confirms
+    publish_confirms: bool = os.getenv("MQ_PUBLISH_CONFIRMS", "0") == "1"
+
 
 def connect(settings: MQSettings) -> pika.BlockingConnection:
     credentials = pika.PlainCredentials(settings.user, settings.password)
@@ -46,7 +64,15 @@ def connect(settings: MQSettings) -> pika.BlockingConnection:
     return pika.BlockingConnection(params)
 
 
+def _topology_key(s: MQSettings) -> tuple[str, int, str, str]:
+    return (s.host, s.port, s.vhost, s.exchange)
+
+
 def declare_topology(ch: pika.adapters.blocking_connection.BlockingChannel, s: MQSettings) -> None:
+    key = _topology_key(s)
+    if key in _declared:
+        return
+
     ch.exchange_declare(exchange=s.exchange, exchange_type=s.exchange_type, durable=True)
 
     # requests
@@ -72,3 +98,30 @@ def declare_topology(ch: pika.adapters.blocking_connection.BlockingChannel, s: M
     # DLQ
     ch.queue_declare(queue=s.dlq_queue, durable=True)
     ch.queue_bind(queue=s.dlq_queue, exchange=s.exchange, routing_key=s.dlq_rk)
+
+    _declared.add(key)
+
+
+def ensure_topology(
+    conn: pika.BlockingConnection,
+    ch: pika.adapters.blocking_connection.BlockingChannel,
+    s: MQSettings,
+) -> pika.adapters.blocking_connection.BlockingChannel:
+    """
+    Для клиентов: топологию объявляет воркер, клиенту достаточно одной пассивной
+    проверки очереди запросов вместо полного набора declare/bind.
+    Возвращает канал, с которым дальше работать (после 404 брокер закрывает канал).
+    """
+    key = _topology_key(s)
+    if key in _declared:
+        return ch
+
+    try:
+        ch.queue_declare(queue=s.requests_queue, passive=True)
+    except pika.exceptions.ChannelClosedByBroker:
+        # воркер ещё ни разу не запускался — объявляем всё сами на новом канале
+        ch = conn.channel()
+        declare_topology(ch, s)
+
+    _declared.add(key)
+    return ch
@@ -1,41 +1,110 @@
-import json
 import logging
+import logging.handlers
+import queue
+import re
 import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
 import pika
-from jose import JWTError, jwt
-from sqlalchemy import Column, DateTime, JSON, String
-from sqlalchemy.orm import Session
+from jose import JWTError
+from sqlalchemy import Column, DateTime, LargeBinary, String, bindparam, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
 
 from lab4.mq_common import MQSettings, connect, declare_topology
 
 from app.api import deps
-from app.core.config import settings
-from app.db.models import UserDB, TaskDB
-from app.db.session import Base, SessionLocal, engine
+from app.db.models import TaskDB, TaskPriority, TaskStatus, UserDB
+from app.db.session import Base, engine
 
 
 # ---------- Логи ----------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
+log = logging.getLogger("mq-worker")
+
+
+def _start_logging() -> logging.handlers.QueueListener:
+    """
+    Обработчик сообщений только кладёт запись в очередь; в файл и консоль
+    пишет поток QueueListener, цикл не ждёт диск. Настраивается из main(),
+    чтобы импорт модуля (тесты, утилиты) не подключал очередь, которую никто не читает.
+    """
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    handlers = [
         logging.FileHandler("lab4_worker.log", encoding="utf-8"),
         logging.StreamHandler(),
-    ],
-)
-log = logging.getLogger("mq-worker")
+    ]
+    for h in handlers:
+        h.setFormatter(formatter)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    logging.root.setLevel(logging.INFO)
+    logging.root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    return listener
+
+# предупреждаем об обычных reply-очередях один раз, а не на каждое сообщение
+_transient_reply_warned = False
+
+
+# ---------- БД ----------
+# одна сессия на поток воркера, переиспользуется между сообщениями;
+# expire_on_commit=False — после commit атрибуты не перечитываются отдельными SELECT'ами
+_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+WorkerSession = scoped_session(_session_factory)
 
 
 # ---------- Идемпотентность через БД ----------
+class FastJSON(TypeDecorator):
+    """JSON-значение, хранимое байтами orjson (bytea): без stdlib json на записи и чтении."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return orjson.dumps(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        # psycopg2 отдаёт bytea как memoryview — orjson принимает и его
+        return orjson.loads(value) if value is not None else None
+
+
 class ProcessedRequestDB(Base):
     __tablename__ = "processed_requests"
 
     id = Column(String(64), primary_key=True, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    response_json = Column(JSON, nullable=False)
+    # индекс — для чистки старых записей по диапазону дат
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    response_json = Column(FastJSON, nullable=False)
+
+
+RECENT_IDS_MAX_SIZE = 10_000
+
+# req_id -> ответ для недавно обработанных запросов; LRU перед SELECT по processed_requests.
+# Оптимистичный кэш: источник правды — БД (промах всё равно идёт туда)
+_recent_ids: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def _remember(req_id: str, resp: Dict[str, Any]) -> None:
+    _recent_ids[req_id] = resp
+    _recent_ids.move_to_end(req_id)
+    while len(_recent_ids) > RECENT_IDS_MAX_SIZE:
+        _recent_ids.popitem(last=False)
+
+
+def _save_processed(responses: Dict[str, Dict[str, Any]]) -> None:
+    """Одна вставка на пачку ответов; id, уже записанные другим воркером, пропускаются."""
+    rows = [{"id": req_id, "response_json": resp} for req_id, resp in responses.items()]
+    with _session_factory() as db:
+        insert_ = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+        stmt = insert_(ProcessedRequestDB).on_conflict_do_nothing(index_elements=["id"])
+        db.execute(stmt, rows)
+        db.commit()
 
 
 def ensure_tables():
@@ -46,7 +115,7 @@ def ensure_tables():
 # ---------- Helpers ----------
 def _safe_json_loads(raw: bytes) -> Dict[str, Any]:
     try:
-        return json.loads(raw.decode("utf-8"))
+        return orjson.loads(raw)
     except Exception as e:
         raise ValueError(f"Invalid JSON: {e}")
 
@@ -61,16 +130,30 @@ def _publish_response(
     props: pika.BasicProperties,
     body: Dict[str, Any],
 ):
-    payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    payload = orjson.dumps(body)
 
     # RPC-style: если client прислал reply_to — отвечаем туда (НЕ queue_declare!)
     if props.reply_to:
+        global _transient_reply_warned
+
+        # Direct Reply-To (брокер подставляет amq.rabbitmq.reply-to.<id>):
+        # сообщение идёт прямо в канал клиента, persistence там всё равно игнорируется.
+        # Собственная очередь клиента тоже нужна только живому ожидающему клиенту —
+        # ответ transient, брокеру незачем писать его на диск
+        direct = props.reply_to.startswith(s.direct_reply_to)
+        if not direct and not _transient_reply_warned:
+            _transient_reply_warned = True
+            log.warning(
+                "client replies via its own queue %s; use %s to avoid per-client queue declares",
+                props.reply_to, s.direct_reply_to,
+            )
+
         ch.basic_publish(
             exchange="",
             routing_key=props.reply_to,
             properties=pika.BasicProperties(
                 correlation_id=props.correlation_id,
-                delivery_mode=2,
+                delivery_mode=None if direct else 1,
                 content_type="application/json",
             ),
             body=payload,
@@ -90,6 +173,83 @@ def _publish_response(
     )
 
 
+# сколько несохранённых ответов держим в буфере, пока запись в БД не проходит
+PENDING_RESPONSES_MAX_SIZE = 1_000
+
+
+class AckBatcher:
+    """
+    Групповые подтверждения: вместо basic_ack на каждое сообщение —
+    один basic_ack(multiple=True) на пачку. Сообщения обрабатываются строго
+    по порядку, поэтому multiple по последнему тегу подтверждает ровно обработанные.
+
+    Ответы для идемпотентности копятся тут же и пишутся в processed_requests
+    одной вставкой перед ack'ом пачки: сообщение подтверждается только после
+    того, как его ответ сохранён.
+
+    Если вставка не прошла, в очередь (nack с requeue) возвращаются только сообщения
+    с несохранённым ответом: их ответы остаются в буфере, повторная доставка отвечает
+    из него без повторного выполнения, запись повторится при следующем flush.
+    Остальные (retry, DLQ без ответа, health, replay) подтверждаются — их действие
+    уже выполнено, и redelivery только повторил бы его.
+    """
+
+    def __init__(self, conn: pika.BlockingConnection, ch, batch_size: int, flush_interval_s: float):
+        self.conn = conn
+        self.ch = ch
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval_s = flush_interval_s
+        # (delivery_tag, req_id ответа в буфере или None) по порядку получения
+        self.tags: List[Tuple[int, Optional[str]]] = []
+        self.timer = None
+        # req_id -> ответ, ещё не записанный в БД
+        self.responses: Dict[str, Dict[str, Any]] = {}
+
+    def ack(self, delivery_tag: int, req_id: Optional[str] = None, resp: Optional[Dict[str, Any]] = None) -> None:
+        if req_id is not None:
+            self.responses[req_id] = resp
+        self.tags.append((delivery_tag, req_id))
+        if len(self.tags) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            # в тихие периоды не держим сообщения неподтверждёнными дольше интервала
+            self.timer = self.conn.call_later(self.flush_interval_s, self.flush)
+
+    def flush(self) -> None:
+        if self.timer is not None:
+            self.conn.remove_timeout(self.timer)
+            self.timer = None
+        if self.responses:
+            try:
+                _save_processed(self.responses)
+            except Exception:
+                log.exception("failed to save %s processed responses", len(self.responses))
+                self._settle_unsaved()
+                return
+            for req_id, resp in self.responses.items():
+                _remember(req_id, resp)
+            self.responses = {}
+        if self.tags:
+            self.ch.basic_ack(delivery_tag=self.tags[-1][0], multiple=True)
+            self.tags = []
+
+    def _settle_unsaved(self) -> None:
+        # пока БД недоступна, буфер не должен расти без предела: самые старые ответы отбрасываем
+        excess = len(self.responses) - PENDING_RESPONSES_MAX_SIZE
+        if excess > 0:
+            for req_id in list(self.responses)[:excess]:
+                del self.responses[req_id]
+            log.error("dropped %s unsaved processed responses", excess)
+
+        # по одному: в пачке вперемешку сообщения, которые можно и нельзя возвращать
+        for tag, req_id in self.tags:
+            if req_id is not None and req_id in self.responses:
+                self.ch.basic_nack(delivery_tag=tag, multiple=False, requeue=True)
+            else:
+                self.ch.basic_ack(delivery_tag=tag, multiple=False)
+        self.tags = []
+
+
 def _get_retry_count(props: pika.BasicProperties) -> int:
     h = props.headers or {}
     try:
@@ -101,9 +261,10 @@ def _get_retry_count(props: pika.BasicProperties) -> int:
 def _republish_to_retry(
     ch: pika.adapters.blocking_connection.BlockingChannel,
     s: MQSettings,
-    req_body: Dict[str, Any],
+    body: bytes,
     props: pika.BasicProperties,
 ):
+    # счётчик повторов — в заголовках AMQP, тело уходит как пришло, без повторной сериализации
     retry_count = _get_retry_count(props) + 1
     new_props = pika.BasicProperties(
         correlation_id=props.correlation_id,
@@ -116,22 +277,29 @@ def _republish_to_retry(
         exchange=s.exchange,
         routing_key=s.retry_rk,
         properties=new_props,
-        body=json.dumps(req_body, ensure_ascii=False).encode("utf-8"),
+        body=body,
     )
     return retry_count
 
 
+# у DLQ-сообщений свойства одинаковые (correlation_id и reply_to лежат в теле) —
+# объект общий; pika сериализует его при публикации и не изменяет
+_DLQ_PROPS = pika.BasicProperties(delivery_mode=2, content_type="application/json")
+
+
 def _send_to_dlq(
     ch: pika.adapters.blocking_connection.BlockingChannel,
     s: MQSettings,
-    req_body: Dict[str, Any],
+    body: Optional[bytes],
     props: pika.BasicProperties,
     reason: str,
 ):
+    # уже разобранный исходный запрос вставляется в payload готовыми байтами (Fragment);
+    # None — тело не разобралось как JSON, тогда request пустой
     dlq_payload = {
         "failed_at": datetime.utcnow().isoformat(),
         "reason": reason,
-        "request": req_body,
+        "request": orjson.Fragment(body) if body is not None else {},
         "correlation_id": props.correlation_id,
         "reply_to": props.reply_to,
         "headers": props.headers or {},
@@ -139,8 +307,8 @@ def _send_to_dlq(
     ch.basic_publish(
         exchange=s.exchange,
         routing_key=s.dlq_rk,
-        properties=pika.BasicProperties(delivery_mode=2, content_type="application/json"),
-        body=json.dumps(dlq_payload, ensure_ascii=False, default=str).encode("utf-8"),
+        properties=_DLQ_PROPS,
+        body=orjson.dumps(dlq_payload, default=str),
     )
 
 
@@ -150,8 +318,9 @@ def _auth_user_from_token(db: Session, token: str) -> UserDB:
     if token.lower().startswith("bearer "):
         token = token.split(" ", 1)[1].strip()
 
+    # те же кэши, что и в HTTP-версии: разобранные токены (до exp) и пользователи по id
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = deps.decode_access_token(token)
     except JWTError:
         raise ValueError("Invalid token")
 
@@ -159,12 +328,44 @@ def _auth_user_from_token(db: Session, token: str) -> UserDB:
     if not user_id:
         raise ValueError("Invalid token payload (no sub)")
 
-    user = db.query(UserDB).filter(UserDB.id == int(user_id)).first()
+    user = deps.get_user_by_id(db, int(user_id))
     if not user:
         raise ValueError("User not found")
     return user
 
 
+# запрос собирается один раз; значения передаются bind-параметрами,
+# так что SQL компилируется единожды и дальше берётся из кэша engine
+_SELECT_OWN_TASKS = (
+    select(TaskDB)
+    .where(TaskDB.owner_id == bindparam("owner_id"))
+    .order_by(TaskDB.id.desc())
+)
+
+
+def _get_own_task(db: Session, task_id: Any, owner_id: int) -> Optional[TaskDB]:
+    # PK-путь (identity map, готовый SELECT по id); чужая задача — как несуществующая
+    t = db.get(TaskDB, int(task_id))
+    if t is None or t.owner_id != owner_id:
+        return None
+    return t
+
+
+# "YYYY-MM-DD" или "YYYY-MM-DD[T ]HH:MM[:SS[.ffffff]]" с необязательной зоной
+_DUE_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?)?(Z|[+-]\d{2}:\d{2})?")
+
+
+def _parse_due(value: Any) -> Optional[datetime]:
+    """Разбирает due_date; None, если строка не в ISO-формате."""
+    # регулярка отсекает мусор без исключений, fromisoformat (C) ловит только невозможные даты
+    if not isinstance(value, str) or not _DUE_DATE_RE.fullmatch(value):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
 def _task_to_dict(t: TaskDB) -> Dict[str, Any]:
     return {
         "id": t.id,
@@ -179,6 +380,163 @@ def _task_to_dict(t: TaskDB) -> Dict[str, Any]:
     }
 
 
+# ---------- Handlers ----------
+# у всех одна сигнатура: (db, req_id, version, data, user); user = None для публичных
+def _h_health_check(db: Session, req_id: str, version: str, data: Dict[str, Any], user: Optional[UserDB]):
+    return _make_resp(req_id, "ok", data={"status": "ok"})
+
+
+def _h_register(db: Session, req_id: str, version: str, data: Dict[str, Any], user: Optional[UserDB]):
+    email = data.get("email")
+    password = data.get("password")
+    full_name = data.get("full_name")
+    if not email or not password or not full_name:
+        return _make_resp(req_id, "error", error="email/password/full_name required")
+
+    existing = deps.get_user_by_email(db, email)
+    if existing:
+        return _make_resp(req_id, "error", error="User already exists")
+
+    user = UserDB(email=email, password_hash=deps.hash_password(password), full_name=full_name)
+    db.add(user)
+    # id проставляется при flush, expire_on_commit=False — перечитывать не нужно
+    db.commit()
+    return _make_resp(req_id, "ok", data={"id": user.id, "email": user.email, "full_name": user.full_name})
+
+
+def _h_login(db: Session, req_id: str, version: str, data: Dict[str, Any], user: Optional[UserDB]):
+    email = data.get("email")
+    password = data.get("password")
+    if not email or not password:
+        return _make_resp(req_id, "error", error="email/password required")
+
+    user = deps.get_user_by_email(db, email)
+    if not user or not deps.verify_password(password, user.password_hash):
+        return _make_resp(req_id, "error", error="Incorrect email or password")
+
+    token = deps.create_access_token({"sub": str(user.id)})
+    return _make_resp(req_id, "ok", data={"access_token": token, "token_type": "bearer"})
+
+
+def _h_create_task(db: Session, req_id: str, version: str, data: Dict[str, Any], user: UserDB):
+    title = data.get("title")
+    description = data.get("description")
+    due_date = data.get("due_date")
+
+    if not title:
+        return _make_resp(req_id, "error", error="title required")
+
+    values: Dict[str, Any] = {
+        "owner_id": user.id,
+        "title": title,
+        "description": description,
+    }
+
+    # v2 поддерживает priority
+    # неверное значение — ValueError сразу, как в update, а не ошибка БД с retry
+    if version == "v2" and data.get("priority"):
+        values["priority"] = TaskPriority(data["priority"])
+
+    # due_date: "YYYY-MM-DD" или ISO
+    if due_date:
+        values["due_date"] = _parse_due(due_date)
+        if values["due_date"] is None:
+            return _make_resp(req_id, "error", error="due_date must be ISO format, e.g. 2025-12-31 or 2025-12-31T10:00:00")
+
+    # INSERT ... RETURNING: строка с id и значениями по умолчанию за один запрос, без refresh
+    task = db.execute(insert(TaskDB).values(**values).returning(TaskDB)).scalar_one()
+    db.commit()
+    return _make_resp(req_id, "ok", data=_task_to_dict(task))
+
+
+def _h_list_tasks(db: Session, req_id: str, version: str, data: Dict[str, Any], user: UserDB):
+    tasks = db.execute(_SELECT_OWN_TASKS, {"owner_id": user.id}).scalars().all()
+    return _make_resp(req_id, "ok", data=[_task_to_dict(t) for t in tasks])
+
+
+def _h_get_task(db: Session, req_id: str, version: str, data: Dict[str, Any], user: UserDB):
+    task_id = data.get("task_id")
+    if not task_id:
+        return _make_resp(req_id, "error", error="task_id required")
+    t = _get_own_task(db, task_id, user.id)
+    if not t:
+        return _make_resp(req_id, "error", error="Task not found")
+    return _make_resp(req_id, "ok", data=_task_to_dict(t))
+
+
+def _h_update_task(db: Session, req_id: str, version: str, data: Dict[str, Any], user: UserDB):
+    task_id = data.get("task_id")
+    if not task_id:
+        return _make_resp(req_id, "error", error="task_id required")
+    t = _get_own_task(db, task_id, user.id)
+    if not t:
+        return _make_resp(req_id, "error", error="Task not found")
+
+    for field in ["title", "description", "status", "priority"]:
+        if field in data and data[field] is not None:
+            if field == "priority" and version != "v2":
+                continue
+            value = data[field]
+            # enum сразу, как его вернула бы БД: ответ собирается без refresh
+            if field == "status":
+                value = TaskStatus(value)
+            elif field == "priority":
+                value = TaskPriority(value)
+            setattr(t, field, value)
+
+    if "due_date" in data:
+        if data["due_date"] is None:
+            t.due_date = None
+        else:
+            due_date = _parse_due(data["due_date"])
+            if due_date is None:
+                return _make_resp(req_id, "error", error="due_date must be ISO format")
+            t.due_date = due_date
+
+    # колонка без таймзоны: храним и отдаём UTC без tzinfo, как после чтения из БД
+    t.updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.commit()
+    return _make_resp(req_id, "ok", data=_task_to_dict(t))
+
+
+def _h_delete_task(db: Session, req_id: str, version: str, data: Dict[str, Any], user: UserDB):
+    task_id = data.get("task_id")
+    if not task_id:
+        return _make_resp(req_id, "error", error="task_id required")
+    t = _get_own_task(db, task_id, user.id)
+    if not t:
+        return _make_resp(req_id, "error", error="Task not found")
+    db.delete(t)
+    db.commit()
+    return _make_resp(req_id, "ok", data={"deleted": True, "task_id": int(task_id)})
+
+
+# без токена (как в HTTP-версии) — только конкретные версии
+PUBLIC_HANDLERS = {
+    ("v1", "health_check"): _h_health_check,
+    ("v1", "register"): _h_register,
+    ("v1", "login"): _h_login,
+}
+
+# требуют JWT в поле auth; версию обработчик учитывает сам (priority только в v2)
+AUTH_HANDLERS = {
+    "create_task": _h_create_task,
+    "list_tasks": _h_list_tasks,
+    "get_task": _h_get_task,
+    "update_task": _h_update_task,
+    "delete_task": _h_delete_task,
+}
+
+
+def _is_plain_health_check(req: Dict[str, Any]) -> bool:
+    # health_check без simulate_temp_error не трогает БД и всегда отвечает одинаково —
+    # ни поиск готового ответа, ни сохранение для идемпотентности ему не нужны
+    if req.get("version") != "v1" or req.get("action") != "health_check" or not req.get("id"):
+        return False
+    data = req.get("data") or {}
+    return data.get("simulate_temp_error") is not True
+
+
 def handle_request(db: Session, req: Dict[str, Any]) -> Dict[str, Any]:
     req_id = str(req.get("id") or "")
     version = str(req.get("version") or "")
@@ -192,40 +550,9 @@ def handle_request(db: Session, req: Dict[str, Any]) -> Dict[str, Any]:
     if not req_id or not version or not action:
         return _make_resp(req_id or "unknown", "error", error="Missing required fields: id/version/action")
 
-    # v1.health_check без токена
-    if version == "v1" and action == "health_check":
-        return _make_resp(req_id, "ok", data={"status": "ok"})
-
-    # v1.register / v1.login — без токена (как в HTTP-версии)
-    if version == "v1" and action == "register":
-        email = data.get("email")
-        password = data.get("password")
-        full_name = data.get("full_name")
-        if not email or not password or not full_name:
-            return _make_resp(req_id, "error", error="email/password/full_name required")
-
-        existing = deps.get_user_by_email(db, email)
-        if existing:
-            return _make_resp(req_id, "error", error="User already exists")
-
-        user = UserDB(email=email, password_hash=deps.hash_password(password), full_name=full_name)
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        return _make_resp(req_id, "ok", data={"id": user.id, "email": user.email, "full_name": user.full_name})
-
-    if version == "v1" and action == "login":
-        email = data.get("email")
-        password = data.get("password")
-        if not email or not password:
-            return _make_resp(req_id, "error", error="email/password required")
-
-        user = deps.get_user_by_email(db, email)
-        if not user or not deps.verify_password(password, user.password_hash):
-            return _make_resp(req_id, "error", error="Incorrect email or password")
-
-        token = deps.create_access_token({"sub": str(user.id)})
-        return _make_resp(req_id, "ok", data={"access_token": token, "token_type": "bearer"})
+    handler = PUBLIC_HANDLERS.get((version, action))
+    if handler is not None:
+        return handler(db, req_id, version, data, None)
 
     # Всё остальное — требует JWT в поле auth
     if not auth:
@@ -236,107 +563,47 @@ def handle_request(db: Session, req: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError as e:
         return _make_resp(req_id, "error", error=str(e))
 
-    # ---------- TASKS ----------
-    if action == "create_task":
-        title = data.get("title")
-        description = data.get("description")
-        due_date = data.get("due_date")
-
-        if not title:
-            return _make_resp(req_id, "error", error="title required")
+    handler = AUTH_HANDLERS.get(action)
+    if handler is None:
+        return _make_resp(req_id, "error", error=f"Unknown action: {version}.{action}")
+    return handler(db, req_id, version, data, current_user)
 
-        task = TaskDB(
-            owner_id=current_user.id,
-            title=title,
-            description=description,
-        )
-
-        # v2 поддерживает priority
-        if version == "v2" and data.get("priority"):
-            task.priority = data["priority"]
-
-        # due_date: "YYYY-MM-DD" или ISO
-        if due_date:
-            try:
-                task.due_date = datetime.fromisoformat(due_date)
-            except Exception:
-                return _make_resp(req_id, "error", error="due_date must be ISO format, e.g. 2025-12-31 or 2025-12-31T10:00:00")
 
-        db.add(task)
-        db.commit()
-        db.refresh(task)
-        return _make_resp(req_id, "ok", data=_task_to_dict(task))
-
-    if action == "list_tasks":
-        tasks = db.query(TaskDB).filter(TaskDB.owner_id == current_user.id).order_by(TaskDB.id.desc()).all()
-        return _make_resp(req_id, "ok", data=[_task_to_dict(t) for t in tasks])
-
-    if action == "get_task":
-        task_id = data.get("task_id")
-        if not task_id:
-            return _make_resp(req_id, "error", error="task_id required")
-        t = db.query(TaskDB).filter(TaskDB.id == int(task_id), TaskDB.owner_id == current_user.id).first()
-        if not t:
-            return _make_resp(req_id, "error", error="Task not found")
-        return _make_resp(req_id, "ok", data=_task_to_dict(t))
-
-    if action == "update_task":
-        task_id = data.get("task_id")
-        if not task_id:
-            return _make_resp(req_id, "error", error="task_id required")
-        t = db.query(TaskDB).filter(TaskDB.id == int(task_id), TaskDB.owner_id == current_user.id).first()
-        if not t:
-            return _make_resp(req_id, "error", error="Task not found")
-
-        for field in ["title", "description", "status", "priority"]:
-            if field in data and data[field] is not None:
-                if field == "priority" and version != "v2":
-                    continue
-                setattr(t, field, data[field])
-
-        if "due_date" in data:
-            if data["due_date"] is None:
-                t.due_date = None
-            else:
-                try:
-                    t.due_date = datetime.fromisoformat(data["due_date"])
-                except Exception:
-                    return _make_resp(req_id, "error", error="due_date must be ISO format")
-
-        t.updated_at = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(t)
-        return _make_resp(req_id, "ok", data=_task_to_dict(t))
-
-    if action == "delete_task":
-        task_id = data.get("task_id")
-        if not task_id:
-            return _make_resp(req_id, "error", error="task_id required")
-        t = db.query(TaskDB).filter(TaskDB.id == int(task_id), TaskDB.owner_id == current_user.id).first()
-        if not t:
-            return _make_resp(req_id, "error", error="Task not found")
-        db.delete(t)
-        db.commit()
-        return _make_resp(req_id, "ok", data={"deleted": True, "task_id": int(task_id)})
-
-    return _make_resp(req_id, "error", error=f"Unknown action: {version}.{action}")
-
-
-def on_message(ch, method, props, body, s: MQSettings):
-    db = SessionLocal()
+def on_message(ch, method, props, body, s: MQSettings, acks: AckBatcher, durable_ch=None):
+    # retry/DLQ публикуются в durable_ch (канал с confirms), если он есть
+    durable_ch = durable_ch or ch
+    db = WorkerSession()
     req_body = {}
+    raw_body: Optional[bytes] = None
     req_id = "unknown"
 
     try:
         req_body = _safe_json_loads(body)
+        raw_body = body
         req_id = str(req_body.get("id") or "unknown")
 
+        # 0) health_check — сразу ответ, без идемпотентности и сессии
+        if _is_plain_health_check(req_body):
+            _publish_response(ch, s, props, _make_resp(req_id, "ok", data={"status": "ok"}))
+            acks.ack(method.delivery_tag)
+            log.info("ok: %s v1.health_check", req_id)
+            return
+
         # 1) идемпотентность: если уже есть готовый ответ — вернём его
-        cached = db.query(ProcessedRequestDB).filter(ProcessedRequestDB.id == req_id).first()
-        if cached:
-            resp = cached.response_json
+        # (сначала среди ещё не записанных в БД ответов текущей пачки, потом в LRU)
+        resp = acks.responses.get(req_id)
+        if resp is None:
+            resp = _recent_ids.get(req_id)
+            if resp is not None:
+                _recent_ids.move_to_end(req_id)
+        if resp is None:
+            cached = db.get(ProcessedRequestDB, req_id)
+            if cached:
+                resp = cached.response_json
+                _remember(req_id, resp)
+        if resp is not None:
             _publish_response(ch, s, props, resp)
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            acks.ack(method.delivery_tag)
             log.info("idem-replay: %s %s.%s", req_id, req_body.get("version"), req_body.get("action"))
             return
 
@@ -348,64 +615,64 @@ def on_message(ch, method, props, body, s: MQSettings):
         # а resp со status=error — это бизнес-ошибка, её НЕ ретраим
         if resp["status"] == "error":
             # отправим копию в DLQ как "unrecoverable"
-            _send_to_dlq(ch, s, req_body, props, reason=resp["error"] or "error")
+            _send_to_dlq(durable_ch, s, raw_body, props, reason=resp["error"] or "error")
             _publish_response(ch, s, props, resp)
 
-            # сохраняем идемпотентно (чтобы второй раз не гонять)
-            db.add(ProcessedRequestDB(id=req_id, response_json=resp))
-            db.commit()
-
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            # сохраняем идемпотентно (чтобы второй раз не гонять) — вместе с ack'ом пачки
+            acks.ack(method.delivery_tag, req_id, resp)
             log.error("failed: %s %s.%s error=%s", req_id, req_body.get("version"), req_body.get("action"), resp["error"])
             return
 
-        # 4) успех — сохраняем ответ (идемпотентность)
-        db.add(ProcessedRequestDB(id=req_id, response_json=resp))
-        db.commit()
-
-        # 5) ответ клиенту
+        # 4) ответ клиенту
         _publish_response(ch, s, props, resp)
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+        # 5) успех — ответ сохраняется (идемпотентность) вместе с ack'ом пачки
+        acks.ack(method.delivery_tag, req_id, resp)
         log.info("ok: %s %s.%s", req_id, req_body.get("version"), req_body.get("action"))
 
     except ValueError as e:
         # невалидный JSON/поля — это “фатально”
         resp = _make_resp(req_id, "error", error=str(e))
-        _send_to_dlq(ch, s, req_body, props, reason=str(e))
+        _send_to_dlq(durable_ch, s, raw_body, props, reason=str(e))
         _publish_response(ch, s, props, resp)
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        acks.ack(method.delivery_tag)
         log.error("bad-request: %s err=%s", req_id, e)
 
     except Exception as e:
         # это “временный сбой”: retry N раз, потом DLQ+ответ
         retry_count = _get_retry_count(props)
         if retry_count < s.max_retries:
-            new_retry = _republish_to_retry(ch, s, req_body, props)
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            new_retry = _republish_to_retry(durable_ch, s, body, props)
+            acks.ack(method.delivery_tag)
             log.warning("retry #%s for %s because %s", new_retry, req_id, e)
             return
 
         # retries exhausted
         reason = f"retries exhausted: {e}"
-        _send_to_dlq(ch, s, req_body, props, reason=reason)
+        _send_to_dlq(durable_ch, s, raw_body, props, reason=reason)
         resp = _make_resp(req_id, "error", error=reason)
         _publish_response(ch, s, props, resp)
 
         # сохраняем, чтобы не дублировать после повторной отправки того же id
-        try:
-            db.add(ProcessedRequestDB(id=req_id, response_json=resp))
-            db.commit()
-        except Exception:
-            db.rollback()
-
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        acks.ack(method.delivery_tag, req_id, resp)
         log.error("dead-lettered: %s err=%s", req_id, e)
 
     finally:
+        # close() только сбрасывает identity map и возвращает соединение в пул;
+        # сам объект сессии остаётся в реестре и достанется следующему сообщению
         db.close()
 
 
 def main():
+    listener = _start_logging()
+    try:
+        _run()
+    finally:
+        # дописываем оставшиеся в очереди записи
+        listener.stop()
+
+
+def _run():
     ensure_tables()
     s = MQSettings()
 
@@ -413,15 +680,34 @@ def main():
     ch = conn.channel()
     declare_topology(ch, s)
 
-    ch.basic_qos(prefetch_count=1)
+    # пачка ack'ов должна быть меньше prefetch, иначе брокер перестанет слать сообщения
+    # до срабатывания таймера
+    ch.basic_qos(prefetch_count=s.prefetch_count)
+    acks = AckBatcher(conn, ch, min(s.ack_batch_size, s.prefetch_count // 2), s.ack_flush_interval_s)
+
+    # на BlockingChannel confirm ждётся синхронно на каждый publish, поэтому включаем его
+    # только на отдельном канале для редких retry/DLQ, а не на основном с ответами
+    durable_ch = None
+    if s.publish_confirms:
+        durable_ch = conn.channel()
+        durable_ch.confirm_delivery()
+
     ch.basic_consume(
         queue=s.requests_queue,
-        on_message_callback=lambda ch_, method, props, body: on_message(ch_, method, props, body, s),
+        on_message_callback=lambda ch_, method, props, body: on_message(ch_, method, props, body, s, acks, durable_ch),
         auto_ack=False,
     )
 
-    log.info("worker started, consuming %s on %s:%s", s.requests_queue, s.host, s.port)
-    ch.start_consuming()
+    log.info(
+        "worker started, consuming %s on %s:%s (prefetch=%s)",
+        s.requests_queue, s.host, s.port, s.prefetch_count,
+    )
+    try:
+        ch.start_consuming()
+    finally:
+        # при штатной остановке подтверждаем то, что уже обработали
+        if ch.is_open:
+            acks.flush()
 
 
 if __name__ == "__main__":